@@ -0,0 +1,111 @@
+"""
+Content-addressed result cache for pure Dapr workflow activities.
+
+Workflow code must stay deterministic, so the cache lives on the activity side:
+a cached activity still gets scheduled by the orchestrator, but on a hit the
+worker answers from the Dapr state store instead of redoing the work.
+"""
+import hashlib
+import json
+import logging
+from dataclasses import asdict, is_dataclass
+from functools import wraps
+from typing import Any, Collection, Optional
+
+from dapr.aio.clients import DaprClient
+
+try:
+    import xxhash
+except ImportError:  # optional: fall back to blake2b from the standard library
+    xxhash = None
+
+
+STATE_STORE = "statestore"
+TTL_SECONDS = 3600
+
+logger = logging.getLogger(__name__)
+
+# One client (and gRPC channel) per worker process, created on first use
+_client: Optional[DaprClient] = None
+
+
+def _get_client() -> DaprClient:
+    global _client
+    if _client is None:
+        _client = DaprClient()
+    return _client
+
+
+def _encode(value: Any) -> Any:
+    if is_dataclass(value):
+        return asdict(value)
+    raise TypeError(f"Cannot hash activity input of type {type(value).__name__}")
+
+
+def _digest(payload: bytes) -> str:
+    # 128-bit digests: a collision would serve another input's cached result.
+    # The algorithm is part of the key so workers with and without xxhash
+    # never read each other's entries.
+    if xxhash is not None:
+        return "xxh3:" + xxhash.xxh3_128_hexdigest(payload)
+    return "b2:" + hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+def cache_key(name: str, input: Any) -> str:
+    """Stable hash of an activity invocation: same name + same input -> same key."""
+    payload = json.dumps([name, input], sort_keys=True, separators=(",", ":"), default=_encode)
+    return f"activity:{name}:{_digest(payload.encode())}"
+
+
+# The cache is best-effort: a state store that is down or misconfigured only
+# costs the speed-up, it never fails the activity it wraps.
+
+async def load(key: str, store: str = STATE_STORE) -> Any:
+    """Return the value cached under `key`, or None on a miss or a state store error."""
+    try:
+        cached = await _get_client().get_state(store, key)
+        return json.loads(cached.data) if cached.data else None
+    except Exception:
+        logger.warning("Activity cache read failed for %s; treating as a miss", key, exc_info=True)
+        return None
+
+
+async def save(key: str, value: Any, store: str = STATE_STORE, ttl_seconds: int = TTL_SECONDS) -> None:
+    """Cache `value` under `key` for `ttl_seconds`; a state store error is logged and ignored."""
+    try:
+        await _get_client().save_state(
+            store,
+            key,
+            json.dumps(value),
+            state_metadata={"ttlInSeconds": str(ttl_seconds)},
+        )
+    except Exception:
+        logger.warning("Activity cache write failed for %s; result not cached", key, exc_info=True)
+
+
+def memoize(pure: Collection[str], store: str = STATE_STORE, ttl_seconds: int = TTL_SECONDS):
+    """
+    Build a decorator that caches activity results in a Dapr state store.
+
+    Only activities whose name is in `pure` are wrapped; anything else is
+    returned untouched, so side-effecting activities are never cached even
+    if decorated by mistake.
+    """
+    def decorator(fn):
+        if fn.__name__ not in pure:
+            return fn
+
+        @wraps(fn)
+        async def wrapper(ctx, input):
+            key = cache_key(fn.__name__, input)
+            cached = await load(key, store)
+            if cached is not None:
+                return cached
+
+            result = await fn(ctx, input)
+            await save(key, result, store, ttl_seconds)
+            return result
+
+        return wrapper
+
+    return decorator
@@ -1,24 +1,83 @@
+import asyncio
 from datetime import timedelta
 from dataclasses import dataclass
-from typing import List, Optional, Dict, Any
-from dapr.ext.workflow import DaprWorkflowContext, workflow, activity, when_all, when_any
+from typing import List, Optional, Dict, Any, Tuple, TypedDict, Union
+from dapr.ext.workflow import DaprWorkflowClient, DaprWorkflowContext, workflow, activity, when_all, when_any
 
+from activity_cache import memoize
 
-@dataclass
+
+# Activities whose result depends only on their input and is expensive enough to
+# be worth a state-store round-trip. Cheap checks, checks against changing data
+# (inventory) and side-effecting activities (labels, payments) are not cached.
+PURE_ACTIVITIES = {"check_fraud"}
+memoize_pure = memoize(PURE_ACTIVITIES)
+
+# How long a high-value order waits for manager approval
+_APPROVAL_TIMEOUT = timedelta(hours=24)
+
+
+class OrderItem(TypedDict):
+    """One order line, shaped like the C# and TypeScript samples' items."""
+    product_id: str
+    quantity: int
+
+
+# frozen=True locks the field bindings, not their values: items and payment are
+# still a list and a dict, so OrderInput instances are not hashable.
+@dataclass(slots=True, frozen=True)
 class OrderInput:
     order_id: str
-    items: List[dict]
+    items: List[OrderItem]
     payment: dict
     shipping_address: str
     customer_email: str
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class OrderResult:
     status: str
     success: bool
     tracking_number: Optional[str] = None
-    notifications_sent: Optional[List[str]] = None
+    notifications_sent: Optional[Tuple[str, ...]] = None
+
+
+# Shapes of the dict payloads passed to activities and the child workflow
+class ShippingInput(TypedDict):
+    order_id: str
+    address: str
+
+
+class InventoryCheckInput(TypedDict):
+    """Columnar view of the order items, so stock can be fetched in one bulk read."""
+    product_ids: List[str]
+    quantities: List[int]
+
+
+class NotificationBatchInput(TypedDict):
+    order_id: str
+    email: str
+    tracking: str
+
+
+class EmailNotificationInput(TypedDict):
+    to: str
+    order_id: str
+    tracking: str
+
+
+class OrderNotificationInput(TypedDict):
+    """SMS and push notifications only need the order id."""
+    order_id: str
+
+
+# Failure results carry no per-order data and OrderResult is frozen,
+# so every failed order shares one instance per status.
+_INVALID = OrderResult(status="Invalid", success=False)
+_OUT_OF_STOCK = OrderResult(status="OutOfStock", success=False)
+_FRAUD_DETECTED = OrderResult(status="FraudDetected", success=False)
+_PAYMENT_FAILED = OrderResult(status="PaymentFailed", success=False)
+_APPROVAL_TIMED_OUT = OrderResult(status="ApprovalTimeout", success=False)
 
 
 @workflow
@@ -28,24 +87,17 @@ async def order_processing_workflow(ctx: DaprWorkflowContext, input: OrderInput)
     This workflow handles the complete order lifecycle from validation to shipping.
     """
     
-    # Step 1: Validate the order
-    is_valid: bool = await ctx.call_activity(validate_order, input=input)
-    
-    if not is_valid:
-        return OrderResult(status="Invalid", success=False)
-    
-    # Step 2: Run inventory check and fraud check in PARALLEL
-    inventory_task = ctx.call_activity(check_inventory, input=input.items)
-    fraud_task = ctx.call_activity(check_fraud, input=input.payment)
+    # Steps 1-2: Validate the order and check inventory and fraud in one pre-flight activity
+    preflight: dict = await ctx.call_activity(preflight_check, input=input)
     
-    # Wait for both parallel tasks to complete
-    inventory_result, fraud_result = await when_all([inventory_task, fraud_task])
+    if not preflight["valid"]:
+        return _INVALID
     
-    if not inventory_result["available"]:
-        return OrderResult(status="OutOfStock", success=False)
+    if not preflight["available"]:
+        return _OUT_OF_STOCK
     
-    if fraud_result["is_fraud"]:
-        return OrderResult(status="FraudDetected", success=False)
+    if preflight["is_fraud"]:
+        return _FRAUD_DETECTED
     
     # Step 3: Reserve inventory
     reservation: dict = await ctx.call_activity(reserve_inventory, input=input.items)
@@ -56,21 +108,22 @@ async def order_processing_workflow(ctx: DaprWorkflowContext, input: OrderInput)
     if not payment_result["success"]:
         # Compensate: Release inventory
         await ctx.call_activity(release_inventory, input=reservation["reservation_id"])
-        return OrderResult(status="PaymentFailed", success=False)
+        return _PAYMENT_FAILED
     
     # Step 5: Wait for manager approval if amount is high
     if input.payment["amount"] > 1000:
         # Race between approval event and timeout
         approval_event = ctx.wait_for_external_event("manager_approval")
-        timeout = ctx.create_timer(timedelta(hours=24))
+        timeout = ctx.create_timer(_APPROVAL_TIMEOUT)
         
         winner = await when_any([approval_event, timeout])
         
         if winner == timeout:
-            # Timeout - refund and cancel
-            await ctx.call_activity(refund_payment, input=payment_result["transaction_id"])
-            await ctx.call_activity(release_inventory, input=reservation["reservation_id"])
-            return OrderResult(status="ApprovalTimeout", success=False)
+            # Timeout - refund and cancel in PARALLEL (the two are independent)
+            refund_task = ctx.call_activity(refund_payment, input=payment_result["transaction_id"])
+            release_task = ctx.call_activity(release_inventory, input=reservation["reservation_id"])
+            await when_all([refund_task, release_task])
+            return _APPROVAL_TIMED_OUT
     
     # Step 6: Ship the order using child workflow
     shipping_result: dict = await ctx.call_child_workflow(
@@ -78,32 +131,23 @@ async def order_processing_workflow(ctx: DaprWorkflowContext, input: OrderInput)
         input={"order_id": input.order_id, "address": input.shipping_address}
     )
     
-    # Step 7: Send notifications in PARALLEL
-    email_task = ctx.call_activity(send_email_notification, input={
-        "to": input.customer_email,
+    # Step 7: Send notifications (fanned out inside a single batched activity)
+    notification_results: list = await ctx.call_activity(send_notifications_batch, input={
         "order_id": input.order_id,
+        "email": input.customer_email,
         "tracking": shipping_result["tracking_number"]
     })
-    sms_task = ctx.call_activity(send_sms_notification, input={
-        "order_id": input.order_id
-    })
-    push_task = ctx.call_activity(send_push_notification, input={
-        "order_id": input.order_id
-    })
-    
-    # Wait for all notifications (but don't fail if some don't work)
-    notification_results = await when_all([email_task, sms_task, push_task])
     
     return OrderResult(
         status="Completed",
         success=True,
         tracking_number=shipping_result["tracking_number"],
-        notifications_sent=[r["channel"] for r in notification_results if r["sent"]]
+        notifications_sent=tuple(channel for channel, sent in notification_results if sent)
     )
 
 
 @workflow
-async def shipping_workflow(ctx: DaprWorkflowContext, input: dict) -> dict:
+async def shipping_workflow(ctx: DaprWorkflowContext, input: ShippingInput) -> dict:
     """Child workflow for handling shipping logistics."""
     
     # Create shipping label
@@ -119,26 +163,93 @@ async def shipping_workflow(ctx: DaprWorkflowContext, input: dict) -> dict:
 
 
 # Activity definitions
+@activity
+async def preflight_check(ctx, input: OrderInput) -> dict:
+    """
+    Run order validation, inventory and fraud checks concurrently.
+    Returns as soon as the outcome is decided under the workflow's precedence
+    (Invalid > OutOfStock > FraudDetected), cancelling the checks still running.
+    Fields of the checks after the deciding one are None, whatever finished first.
+    """
+    async def validation_check() -> dict:
+        return {"valid": await validate_order(ctx, input)}
+    
+    async def inventory_check() -> dict:
+        # Built inside the task: a malformed item fails this check, and validation
+        # (which outranks it) then reports the order as Invalid
+        return await check_inventory(ctx, _inventory_columns(input.items))
+    
+    validation = asyncio.create_task(validation_check())
+    inventory = asyncio.create_task(inventory_check())
+    fraud = asyncio.create_task(check_fraud(ctx, input.payment))
+    
+    # In precedence order, each with the test for a failing result
+    checks = (
+        (validation, lambda r: not r["valid"]),
+        (inventory, lambda r: not r["available"]),
+        (fraud, lambda r: r["is_fraud"]),
+    )
+    result = dict.fromkeys(("valid", "available", "items_checked", "is_fraud", "risk_score"))
+    pending = {validation, inventory, fraud}
+    try:
+        while True:
+            _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task, failed in checks:
+                if not task.done():
+                    # A higher-priority check is still running, so a later failure can't decide yet
+                    break
+                outcome = task.result()
+                result.update(outcome)
+                if failed(outcome):
+                    return result
+            else:
+                return result
+    finally:
+        for task in pending:
+            task.cancel()
+        for task in (validation, inventory, fraud):
+            # Retrieve errors of checks that finished after the outcome was decided,
+            # so asyncio doesn't log them as never retrieved
+            if task.done() and not task.cancelled():
+                task.exception()
+
+
 @activity
 async def validate_order(ctx, input: OrderInput) -> bool:
     """Validate order details."""
-    return len(input.items) > 0
+    return len(input.items) > 0 and all(
+        "product_id" in item and "quantity" in item for item in input.items
+    )
+
+
+def _inventory_columns(items: List[OrderItem]) -> InventoryCheckInput:
+    return {
+        "product_ids": [item["product_id"] for item in items],
+        "quantities": [item["quantity"] for item in items],
+    }
 
 
 @activity
-async def check_inventory(ctx, input: List[dict]) -> dict:
-    """Check if items are in stock."""
-    return {"available": True, "items_checked": len(input)}
+async def check_inventory(ctx, input: Union[InventoryCheckInput, List[OrderItem]]) -> dict:
+    """
+    Check if items are in stock.
+    Takes the columnar InventoryCheckInput; a plain list of order items is still
+    accepted for callers that pass order.items directly.
+    """
+    if isinstance(input, list):
+        input = _inventory_columns(input)
+    return {"available": True, "items_checked": len(input["product_ids"])}
 
 
 @activity
+@memoize_pure
 async def check_fraud(ctx, input: dict) -> dict:
     """Check payment for fraud indicators."""
     return {"is_fraud": False, "risk_score": 0.1}
 
 
 @activity
-async def reserve_inventory(ctx, input: List[dict]) -> dict:
+async def reserve_inventory(ctx, input: List[OrderItem]) -> dict:
     """Reserve items in inventory."""
     return {"reservation_id": "res_12345", "items": input}
 
@@ -162,7 +273,7 @@ async def refund_payment(ctx, input: str) -> bool:
 
 
 @activity
-async def create_shipping_label(ctx, input: dict) -> dict:
+async def create_shipping_label(ctx, input: ShippingInput) -> dict:
     """Create shipping label."""
     return {"tracking_number": "TRK123456789", "carrier": "FedEx"}
 
@@ -174,18 +285,56 @@ async def schedule_pickup(ctx, input: dict) -> dict:
 
 
 @activity
-async def send_email_notification(ctx, input: dict) -> dict:
+async def send_email_notification(ctx, input: EmailNotificationInput) -> Tuple[str, bool]:
     """Send order confirmation email."""
-    return {"sent": True, "channel": "email"}
+    return ("email", True)
 
 
 @activity
-async def send_sms_notification(ctx, input: dict) -> dict:
+async def send_sms_notification(ctx, input: OrderNotificationInput) -> Tuple[str, bool]:
     """Send SMS notification."""
-    return {"sent": True, "channel": "sms"}
+    return ("sms", True)
 
 
 @activity
-async def send_push_notification(ctx, input: dict) -> dict:
+async def send_push_notification(ctx, input: OrderNotificationInput) -> Tuple[str, bool]:
     """Send push notification."""
-    return {"sent": True, "channel": "push"}
+    return ("push", True)
+
+
+@activity
+async def send_notifications_batch(ctx, input: NotificationBatchInput) -> List[Tuple[str, bool]]:
+    """Send email, SMS and push notifications concurrently; a failed channel is reported as not sent."""
+    order_id = input["order_id"]
+    channels = ("email", "sms", "push")
+    results = await asyncio.gather(
+        send_email_notification(ctx, {"to": input["email"], "order_id": order_id, "tracking": input["tracking"]}),
+        send_sms_notification(ctx, {"order_id": order_id}),
+        send_push_notification(ctx, {"order_id": order_id}),
+        return_exceptions=True,
+    )
+    return [
+        (channel, False) if isinstance(result, Exception) else result
+        for channel, result in zip(channels, results)
+    ]
+
+
+# Starting the workflow
+def order_instance_id(order_id: str) -> str:
+    """Deterministic workflow instance id for an order: the same order always maps to the same id."""
+    return f"order-{order_id}"
+
+
+def start_order_workflow(client: DaprWorkflowClient, order: OrderInput) -> str:
+    """
+    Example entry point: schedule order processing for `order` and return its instance id.
+
+        client = DaprWorkflowClient()
+        instance_id = start_order_workflow(client, order)
+        client.wait_for_workflow_completion(instance_id)
+    """
+    return client.schedule_new_workflow(
+        workflow=order_processing_workflow,
+        input=order,
+        instance_id=order_instance_id(order.order_id),
+    )
@@ -1,144 +1,78 @@
 """
 Order Processing Workflow with Data Flow Annotations for Visualization.
 
-This version includes explicit data flow metadata that can be parsed
-by DaprVis to show how data objects and properties travel between activities.
+This version of order_processing_workflow.py spells out, step by step, how data
+objects and properties travel between activities, so DaprVis can show the data
+lineage on the visualization. Only the workflow bodies and their input and
+result types live here; the activities and shared payload types are imported
+from order_processing_workflow.py, so keep the workflow bodies in sync with it.
 """
-from datetime import timedelta
-from dataclasses import dataclass, field
-from typing import List, Optional, Dict, Any, TypedDict
-from dapr.ext.workflow import DaprWorkflowContext, workflow, activity, when_all, when_any
+import functools
+import json
+from pathlib import Path
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+from dapr.ext.workflow import DaprWorkflowContext, workflow, when_all, when_any
+
+from order_processing_workflow import (
+    _APPROVAL_TIMEOUT,
+    OrderItem,
+    ShippingInput,
+    _INVALID,
+    _OUT_OF_STOCK,
+    _FRAUD_DETECTED,
+    _PAYMENT_FAILED,
+    _APPROVAL_TIMED_OUT,
+    preflight_check,
+    reserve_inventory,
+    process_payment,
+    release_inventory,
+    refund_payment,
+    create_shipping_label,
+    schedule_pickup,
+    send_notifications_batch,
+)
 
 
 # =============================================================================
-# DATA FLOW METADATA FOR VISUALIZATION
+# DATA FLOW METADATA
 # =============================================================================
-# This metadata describes how data flows through the workflow.
-# DaprVis can parse this to render data lineage on the visualization.
+# The same lineage in machine-readable form, kept in a sibling JSON file and
+# loaded on first use. The extension does not read it; it is for tooling.
 
-WORKFLOW_DATA_FLOW = {
-    "workflow": "order_processing_workflow",
-    "input_schema": {
-        "type": "OrderInput",
-        "properties": ["order_id", "items", "payment", "shipping_address", "customer_email"]
-    },
-    "data_flows": [
-        # Step 1: validate_order
-        {
-            "activity": "validate_order",
-            "consumes": [
-                {"source": "workflow_input", "path": "input"}  # Full OrderInput
-            ],
-            "produces": {"name": "is_valid", "type": "bool"}
-        },
-        # Step 2: Parallel - check_inventory & check_fraud
-        {
-            "activity": "check_inventory",
-            "consumes": [
-                {"source": "workflow_input", "path": "input.items"}
-            ],
-            "produces": {"name": "inventory_result", "type": "dict", "properties": ["available", "items_checked"]}
-        },
-        {
-            "activity": "check_fraud",
-            "consumes": [
-                {"source": "workflow_input", "path": "input.payment"}
-            ],
-            "produces": {"name": "fraud_result", "type": "dict", "properties": ["is_fraud", "risk_score"]}
-        },
-        # Step 3: reserve_inventory
-        {
-            "activity": "reserve_inventory",
-            "consumes": [
-                {"source": "workflow_input", "path": "input.items"}
-            ],
-            "produces": {"name": "reservation", "type": "dict", "properties": ["reservation_id", "items"]}
-        },
-        # Step 4: process_payment - NOTE: consumes from WORKFLOW INPUT, not previous activity!
-        {
-            "activity": "process_payment",
-            "consumes": [
-                {"source": "workflow_input", "path": "input.payment"}  # From original input!
-            ],
-            "produces": {"name": "payment_result", "type": "dict", "properties": ["success", "transaction_id", "amount"]}
-        },
-        # Compensation: release_inventory (if payment fails)
-        {
-            "activity": "release_inventory",
-            "condition": "not payment_result['success']",
-            "consumes": [
-                {"source": "reservation", "path": "reservation['reservation_id']"}  # From activity output
-            ],
-            "produces": {"name": "_", "type": "bool"}
-        },
-        # Step 5: refund_payment (on timeout)
-        {
-            "activity": "refund_payment",
-            "condition": "approval_timeout",
-            "consumes": [
-                {"source": "payment_result", "path": "payment_result['transaction_id']"}
-            ],
-            "produces": {"name": "_", "type": "bool"}
-        },
-        # Step 6: shipping_workflow (child workflow)
-        {
-            "activity": "shipping_workflow",
-            "type": "child_workflow",
-            "consumes": [
-                {"source": "workflow_input", "path": "input.order_id"},
-                {"source": "workflow_input", "path": "input.shipping_address"}
-            ],
-            "produces": {"name": "shipping_result", "type": "dict", "properties": ["tracking_number", "pickup_date"]}
-        },
-        # Step 7: Parallel notifications
-        {
-            "activity": "send_email_notification",
-            "consumes": [
-                {"source": "workflow_input", "path": "input.customer_email"},
-                {"source": "workflow_input", "path": "input.order_id"},
-                {"source": "shipping_result", "path": "shipping_result['tracking_number']"}
-            ],
-            "produces": {"name": "email_result", "type": "dict"}
-        },
-        {
-            "activity": "send_sms_notification",
-            "consumes": [
-                {"source": "workflow_input", "path": "input.order_id"}
-            ],
-            "produces": {"name": "sms_result", "type": "dict"}
-        },
-        {
-            "activity": "send_push_notification",
-            "consumes": [
-                {"source": "workflow_input", "path": "input.order_id"}
-            ],
-            "produces": {"name": "push_result", "type": "dict"}
-        },
-    ]
-}
+_DATA_FLOW_PATH = Path(__file__).with_name("order_processing_workflow.dataflow.json")
+
+
+@functools.cache
+def workflow_data_flow() -> dict:
+    """Load the data flow metadata on first use; later calls share the same dict."""
+    return json.loads(_DATA_FLOW_PATH.read_bytes())
 
 
 # =============================================================================
 # TYPE DEFINITIONS
 # =============================================================================
+# Restated here because DaprVis reads the workflow's input schema from the
+# dataclass in the same file. They mirror order_processing_workflow.py and
+# serialize to the same JSON, so its shared failure results are returned as-is.
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class OrderInput:
     """Input data for order processing workflow."""
     order_id: str
-    items: List[dict]
+    items: List[OrderItem]
     payment: dict
     shipping_address: str
     customer_email: str
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class OrderResult:
     """Result of order processing workflow."""
     status: str
     success: bool
     tracking_number: Optional[str] = None
-    notifications_sent: Optional[List[str]] = None
+    notifications_sent: Optional[Tuple[str, ...]] = None
 
 
 # =============================================================================
@@ -159,29 +93,21 @@ async def order_processing_workflow(ctx: DaprWorkflowContext, input: OrderInput)
     """
     
     # =========================================================================
-    # Step 1: Validate the order
-    # DATA FLOW: input (full OrderInput) → validate_order → is_valid
+    # Steps 1-2: Validate the order, check inventory and check fraud
+    # DATA FLOW: input (full OrderInput) → preflight_check → preflight
+    # NOTE: The three checks still run in PARALLEL, but inside one activity,
+    #       so the orchestrator makes one call instead of three.
     # =========================================================================
-    is_valid: bool = await ctx.call_activity(validate_order, input=input)
+    preflight: dict = await ctx.call_activity(preflight_check, input=input)
     
-    if not is_valid:
-        return OrderResult(status="Invalid", success=False)
+    if not preflight["valid"]:
+        return _INVALID
     
-    # =========================================================================
-    # Step 2: Run inventory check and fraud check in PARALLEL
-    # DATA FLOW: input.items → check_inventory → inventory_result
-    # DATA FLOW: input.payment → check_fraud → fraud_result
-    # =========================================================================
-    inventory_task = ctx.call_activity(check_inventory, input=input.items)
-    fraud_task = ctx.call_activity(check_fraud, input=input.payment)
+    if not preflight["available"]:
+        return _OUT_OF_STOCK
     
-    inventory_result, fraud_result = await when_all([inventory_task, fraud_task])
-    
-    if not inventory_result["available"]:
-        return OrderResult(status="OutOfStock", success=False)
-    
-    if fraud_result["is_fraud"]:
-        return OrderResult(status="FraudDetected", success=False)
+    if preflight["is_fraud"]:
+        return _FRAUD_DETECTED
     
     # =========================================================================
     # Step 3: Reserve inventory
@@ -203,7 +129,7 @@ async def order_processing_workflow(ctx: DaprWorkflowContext, input: OrderInput)
         # NOTE: Now we USE the output from reserve_inventory for compensation!
         # =====================================================================
         await ctx.call_activity(release_inventory, input=reservation["reservation_id"])
-        return OrderResult(status="PaymentFailed", success=False)
+        return _PAYMENT_FAILED
     
     # =========================================================================
     # Step 5: Wait for manager approval if amount is high
@@ -211,19 +137,21 @@ async def order_processing_workflow(ctx: DaprWorkflowContext, input: OrderInput)
     # =========================================================================
     if input.payment["amount"] > 1000:
         approval_event = ctx.wait_for_external_event("manager_approval")
-        timeout = ctx.create_timer(timedelta(hours=24))
+        timeout = ctx.create_timer(_APPROVAL_TIMEOUT)
         
         winner = await when_any([approval_event, timeout])
         
         if winner == timeout:
             # =================================================================
-            # COMPENSATION: Refund and release
+            # COMPENSATION: Refund and release in PARALLEL
             # DATA FLOW: payment_result["transaction_id"] → refund_payment
             # DATA FLOW: reservation["reservation_id"] → release_inventory
+            # NOTE: Neither compensation needs the other's result
             # =================================================================
-            await ctx.call_activity(refund_payment, input=payment_result["transaction_id"])
-            await ctx.call_activity(release_inventory, input=reservation["reservation_id"])
-            return OrderResult(status="ApprovalTimeout", success=False)
+            refund_task = ctx.call_activity(refund_payment, input=payment_result["transaction_id"])
+            release_task = ctx.call_activity(release_inventory, input=reservation["reservation_id"])
+            await when_all([refund_task, release_task])
+            return _APPROVAL_TIMED_OUT
     
     # =========================================================================
     # Step 6: Ship the order using child workflow
@@ -236,26 +164,18 @@ async def order_processing_workflow(ctx: DaprWorkflowContext, input: OrderInput)
     )
     
     # =========================================================================
-    # Step 7: Send notifications in PARALLEL
+    # Step 7: Send notifications in ONE batched activity
     # DATA FLOW: input.customer_email + input.order_id + shipping_result["tracking_number"]
-    #            → send_email_notification
-    # DATA FLOW: input.order_id → send_sms_notification
-    # DATA FLOW: input.order_id → send_push_notification
+    #            → send_notifications_batch → notification_results
     # NOTE: Mixes WORKFLOW INPUT with ACTIVITY OUTPUT (shipping_result)!
+    # NOTE: Email, SMS and push still run in parallel, but inside the activity
+    #       worker, so the workflow history records one task instead of three.
     # =========================================================================
-    email_task = ctx.call_activity(send_email_notification, input={
-        "to": input.customer_email,           # From workflow input
+    notification_results: list = await ctx.call_activity(send_notifications_batch, input={
         "order_id": input.order_id,           # From workflow input
+        "email": input.customer_email,        # From workflow input
         "tracking": shipping_result["tracking_number"]  # From activity output!
     })
-    sms_task = ctx.call_activity(send_sms_notification, input={
-        "order_id": input.order_id            # From workflow input
-    })
-    push_task = ctx.call_activity(send_push_notification, input={
-        "order_id": input.order_id            # From workflow input
-    })
-    
-    notification_results = await when_all([email_task, sms_task, push_task])
     
     # =========================================================================
     # Final Result
@@ -265,69 +185,21 @@ async def order_processing_workflow(ctx: DaprWorkflowContext, input: OrderInput)
         status="Completed",
         success=True,
         tracking_number=shipping_result["tracking_number"],
-        notifications_sent=[r["channel"] for r in notification_results if r["sent"]]
+        notifications_sent=tuple(channel for channel, sent in notification_results if sent)
     )
 
 
 @workflow
-async def shipping_workflow(ctx: DaprWorkflowContext, input: dict) -> dict:
+async def shipping_workflow(ctx: DaprWorkflowContext, input: ShippingInput) -> dict:
     """Child workflow for handling shipping logistics."""
     
+    # Create shipping label
     label: dict = await ctx.call_activity(create_shipping_label, input=input)
+    
+    # Schedule pickup
     pickup: dict = await ctx.call_activity(schedule_pickup, input=label)
+    
+    # Wait for package to be picked up
     await ctx.wait_for_external_event("package_picked_up")
     
     return {"tracking_number": label["tracking_number"], "pickup_date": pickup["date"]}
-
-
-# =============================================================================
-# ACTIVITY DEFINITIONS
-# =============================================================================
-
-@activity
-async def validate_order(ctx, input: OrderInput) -> bool:
-    return len(input.items) > 0
-
-@activity
-async def check_inventory(ctx, input: List[dict]) -> dict:
-    return {"available": True, "items_checked": len(input)}
-
-@activity
-async def check_fraud(ctx, input: dict) -> dict:
-    return {"is_fraud": False, "risk_score": 0.1}
-
-@activity
-async def reserve_inventory(ctx, input: List[dict]) -> dict:
-    return {"reservation_id": "res_12345", "items": input}
-
-@activity
-async def release_inventory(ctx, input: str) -> bool:
-    return True
-
-@activity
-async def process_payment(ctx, input: dict) -> dict:
-    return {"success": True, "transaction_id": "txn_12345", "amount": input.get("amount", 0)}
-
-@activity
-async def refund_payment(ctx, input: str) -> bool:
-    return True
-
-@activity
-async def create_shipping_label(ctx, input: dict) -> dict:
-    return {"tracking_number": "TRK123456789", "carrier": "FedEx"}
-
-@activity
-async def schedule_pickup(ctx, input: dict) -> dict:
-    return {"scheduled": True, "date": "2026-01-27"}
-
-@activity
-async def send_email_notification(ctx, input: dict) -> dict:
-    return {"sent": True, "channel": "email"}
-
-@activity
-async def send_sms_notification(ctx, input: dict) -> dict:
-    return {"sent": True, "channel": "sms"}
-
-@activity
-async def send_push_notification(ctx, input: dict) -> dict:
-    return {"sent": True, "channel": "push"}